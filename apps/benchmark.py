@@ -49,6 +49,13 @@ class TiledRenderer(object):
         self.pixel_size = tm.width * tm.tilewidth, tm.height * tm.tileheight
         self.tmx_data = tm
 
+        # tile layers without any tiles are skipped when rendering
+        self.empty_tile_layers = {
+            layer
+            for layer in tm.layers
+            if isinstance(layer, TiledTileLayer) and not any(map(any, layer.data))
+        }
+
         for layer in self.tmx_data.visible_tile_layers:
             layer = self.tmx_data.layers[layer]
             for i in layer.tiles():
@@ -76,7 +83,8 @@ class TiledRenderer(object):
             # each layer can be handled differently by checking their type
 
             if isinstance(layer, TiledTileLayer):
-                self.render_tile_layer(surface, layer)
+                if layer not in self.empty_tile_layers:
+                    self.render_tile_layer(surface, layer)
 
             elif isinstance(layer, TiledObjectGroup):
                 self.render_object_layer(surface, layer)
@@ -89,11 +97,12 @@ class TiledRenderer(object):
         # deref these heavily used references for speed
         tw = self.tmx_data.tilewidth
         th = self.tmx_data.tileheight
-        surface_blit = surface.blit
 
-        # iterate over the tiles in the layer, and blit them
-        for x, y, image in layer.tiles():
-            surface_blit(image, (x * tw, y * th))
+        # collect the tiles in the layer, and blit them all in one call
+        surface.blits(
+            [(image, (x * tw, y * th)) for x, y, image in layer.tiles()],
+            doreturn=False,
+        )
 
     def render_object_layer(self, surface, layer) -> None:
         """Render all TiledObjects contained in this layer"""
@@ -47,6 +47,13 @@ class TiledRenderer(object):
         self.pixel_size = tm.width * tm.tilewidth, tm.height * tm.tileheight
         self.tmx_data = tm
 
+        # tile layers without any tiles are skipped when rendering
+        self.empty_tile_layers = {
+            layer
+            for layer in tm.layers
+            if isinstance(layer, TiledTileLayer) and not any(map(any, layer.data))
+        }
+
     def render_map(self, surface) -> None:
         """Render our map to a pygame surface
 
@@ -68,7 +75,8 @@ class TiledRenderer(object):
             # each layer can be handled differently by checking their type
 
             if isinstance(layer, TiledTileLayer):
-                self.render_tile_layer(surface, layer)
+                if layer not in self.empty_tile_layers:
+                    self.render_tile_layer(surface, layer)
 
             elif isinstance(layer, TiledObjectGroup):
                 self.render_object_layer(surface, layer)
@@ -81,20 +89,24 @@ class TiledRenderer(object):
         # deref these heavily used references for speed
         tw = self.tmx_data.tilewidth
         th = self.tmx_data.tileheight
-        surface_blit = surface.blit
 
-        # iterate over the tiles in the layer, and blit them
+        # collect the tiles in the layer, and blit them all in one call
         if self.tmx_data.orientation == "orthogonal":
-            for x, y, image in layer.tiles():
-                surface_blit(image, (x * tw, y * th))
+            surface.blits(
+                [(image, (x * tw, y * th)) for x, y, image in layer.tiles()],
+                doreturn=False,
+            )
         elif self.tmx_data.orientation == "isometric":
             ox = self.pixel_size[0] // 2
             tw2 = tw // 2
             th2 = th // 2
-            for x, y, image in layer.tiles():
-                sx = x * tw2 - y * tw2
-                sy = x * th2 + y * th2
-                surface_blit(image, (sx + ox, sy))
+            surface.blits(
+                [
+                    (image, (x * tw2 - y * tw2 + ox, x * th2 + y * th2))
+                    for x, y, image in layer.tiles()
+                ],
+                doreturn=False,
+            )
 
     def render_object_layer(self, surface, layer) -> None:
         """Render all TiledObjects contained in this layer"""
@@ -28,6 +28,7 @@ import zlib
 from base64 import b64decode
 from collections import defaultdict, namedtuple
 from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from itertools import chain, product
 from math import cos, radians, sin
@@ -80,6 +81,10 @@ AnimationFrame = namedtuple("AnimationFrame", ["gid", "duration"])
 Point = namedtuple("Point", ["x", "y"])
 TileFlags = namedtuple("TileFlags", flag_names)
 empty_flags = TileFlags(False, False, False)
+# every combination of flags, indexed by the three high bits of a Tiled gid
+_gid_flags = (empty_flags,) + tuple(
+    TileFlags(bool(i & 4), bool(i & 2), bool(i & 1)) for i in range(1, 8)
+)
 ColorLike = Union[tuple[int, int, int, int], tuple[int, int, int], int, str]
 MapPoint = tuple[int, int, int]
 TiledLayer = Union[
@@ -123,17 +128,7 @@ def decode_gid(raw_gid: int) -> tuple[int, TileFlags]:
         Tuple[int, TileFlags]: Tuple of the GID after rotation flags, and TileFlags object
 
     """
-    if raw_gid < GID_TRANS_ROT:
-        return raw_gid, empty_flags
-    return (
-        raw_gid & ~GID_MASK,
-        # TODO: cache all combinations of flags
-        TileFlags(
-            raw_gid & GID_TRANS_FLIPX == GID_TRANS_FLIPX,
-            raw_gid & GID_TRANS_FLIPY == GID_TRANS_FLIPY,
-            raw_gid & GID_TRANS_ROT == GID_TRANS_ROT,
-        ),
-    )
+    return raw_gid & ~GID_MASK, _gid_flags[raw_gid >> 29]
 
 
 def reshape_data(
@@ -180,7 +175,8 @@ def unpack_gids(
         fmt = "<%dL" % (len(data) // 4)
         return list(struct.unpack(fmt, data))
     elif encoding == "csv":
-        return [int(i) for i in text.split(",")]
+        # int() ignores the newlines Tiled puts between rows
+        return list(map(int, text.split(",")))
     elif encoding:
         raise ValueError(f"layer encoding {encoding} is not supported.")
 
@@ -356,9 +352,7 @@ def parse_properties(node: ElementTree.Element, customs: dict = None) -> dict:
                 )
             if "class" == subnode.get("type"):
                 new = resolve_to_class(subnode.get("propertytype"), customs)
-                properties = parse_properties(subnode, customs)
-                for key in properties.keys():
-                    setattr(new, key, properties[key])
+                new.__dict__.update(parse_properties(subnode, customs))
 
                 d[subnode.get("name")] = new
             else:
@@ -390,24 +384,15 @@ class TiledElement:
         return cls().parse_xml(ElementTree.fromstring(xml_string))
 
     def _cast_and_set_attributes_from_node_items(self, items) -> None:
-        for key, value in items:
-            casted_value = types[key](value)
-            setattr(self, key, casted_value)
+        # one dict merge instead of a setattr per attribute
+        self.__dict__.update((key, types[key](value)) for key, value in items)
 
     def _contains_invalid_property_name(self, items) -> bool:
         if self.allow_duplicate_names:
             return False
 
         for k, v in items:
-            # i'm not sure why, but this hasattr causes problems on python 2.7 with unicode
-            try:
-                # this will be called in py 3+
-                _hasattr = hasattr(self, k)
-            except UnicodeError:
-                # this will be called in py 2.7
-                _hasattr = hasattr(self, k.encode("utf-8"))
-
-            if _hasattr:
+            if hasattr(self, k):
                 msg = duplicate_name_fmt.format(k, self.__class__.__name__, self.name)
                 logger.error(msg)
                 return True
@@ -509,6 +494,7 @@ class TiledMap(TiledElement):
         self.layers = list()  # all layers in proper order
         self.tilesets = list()  # TiledTileset objects
         self.tile_properties = dict()  # tiles that have properties
+        self.has_external_tile_images = False  # any tile has its own image
         self.layernames = dict()
         self.objects_by_id = dict()
         self.objects_by_name = dict()
@@ -642,78 +628,129 @@ class TiledMap(TiledElement):
         images will be loaded.
 
         """
+        # pytmx gids are assigned sequentially by register_gid, and only for
+        # tiles that are used, so a preallocated list is dense and needs no
+        # sparse (dict) storage even when the map uses many tilesets.
         self.images = [None] * self.maxgid
 
-        # iterate through tilesets to get source images
+        dirname = os.path.dirname(self.filename)
+
+        # loaders may decode their images in the pool's threads, and share
+        # files that are used more than once through image_files.  both are
+        # only kept for this load; nothing is left behind afterwards.
+        with ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="pytmx-image-load"
+        ) as executor:
+            self._load_images(dirname, executor=executor, image_files=dict())
+
+    def _load_images(self, dirname: str, **loader_kwargs) -> None:
+        """Create the image loaders, then fill in TiledMap.images.
+
+        Args:
+            dirname (str): Directory that image paths are relative to.
+            **loader_kwargs: Passed to every call of the image loader.
+
+        """
+        # plan the tiles of every tileset from the map data before loading
+        # any images.  tilesets without used tiles are not loaded at all.
+        # loaders may decode their image in the background, so all loaders
+        # are created before any image is requested; images can then be
+        # read while tiles from earlier tilesets are loaded.
+        plans = list()
         for ts in self.tilesets:
             # skip tilesets without a source
             if ts.source is None:
                 continue
 
-            path = os.path.join(os.path.dirname(self.filename), ts.source)
-            colorkey = getattr(ts, "trans", None)
-            loader = self.image_loader(path, colorkey, tileset=ts)
-
-            p = product(
-                range(
-                    ts.margin,
-                    ts.height + ts.margin - ts.tileheight + 1,
-                    ts.tileheight + ts.spacing,
-                ),
-                range(
-                    ts.margin,
-                    ts.width + ts.margin - ts.tilewidth + 1,
-                    ts.tilewidth + ts.spacing,
-                ),
-            )
+            plan = self._plan_tileset_images(ts)
+            if plan:
+                path = os.path.join(dirname, ts.source)
+                colorkey = ts.trans
+                loader = self.image_loader(path, colorkey, tileset=ts, **loader_kwargs)
+                plans.append((loader, plan))
 
-            # iterate through the tiles
-            for real_gid, (y, x) in enumerate(p, ts.firstgid):
-                rect = (x, y, ts.tilewidth, ts.tileheight)
-                gids = self.map_gid(real_gid)
-
-                # gids is None if the tile is never used
-                # but give another chance to load the gid anyway
-                if gids is None:
-                    if self.load_all_tiles or real_gid in self.optional_gids:
-                        # TODO: handle flags? - might never be an issue, though
-                        gids = [self.register_gid(real_gid, flags=0)]
-
-                if gids:
-                    # flags might rotate/flip the image, so let the loader
-                    # handle that here
-                    for gid, flags in gids:
-                        self.images[gid] = loader(rect, flags)
-                # else:
-                #     # not used in layer data give another chance to load the tile anyway
-                #     if self.load_all_tiles or real_gid in self.optional_gids:
-                #         # TODO: handle flags? - might never be an issue, though
-                #         self.register_gid(real_gid, flags=0)
-
-        # load image layer images
+        # image layer images
+        layer_loaders = list()
         for layer in (i for i in self.layers if isinstance(i, TiledImageLayer)):
-            source = getattr(layer, "source", None)
+            source = layer.source
             if source:
-                colorkey = getattr(layer, "trans", None)
-                real_gid = len(self.images)
-                gid = self.register_gid(real_gid)
-                layer.gid = gid
-                path = os.path.join(os.path.dirname(self.filename), source)
-                loader = self.image_loader(path, colorkey)
-                image = loader()
-                self.images.append(image)
-
-        # load images in tiles.
+                colorkey = layer.trans
+                path = os.path.join(dirname, source)
+                loader = self.image_loader(path, colorkey, **loader_kwargs)
+                layer_loaders.append((layer, loader))
+
+        # images in tiles.
         # instead of making a new gid, replace the reference to the tile that
         # was loaded from the tileset
-        for real_gid, props in self.tile_properties.items():
-            source = props.get("source", None)
-            if source:
-                colorkey = props.get("trans", None)
-                path = os.path.join(os.path.dirname(self.filename), source)
-                loader = self.image_loader(path, colorkey)
-                image = loader()
-                self.images[real_gid] = image
+        tile_loaders = list()
+        if self.has_external_tile_images:
+            for real_gid, props in self.tile_properties.items():
+                source = props.get("source", None)
+                if source:
+                    colorkey = props.get("trans", None)
+                    path = os.path.join(dirname, source)
+                    loader = self.image_loader(path, colorkey, **loader_kwargs)
+                    tile_loaders.append((real_gid, loader))
+
+        # flags might rotate/flip the image, so let the loader handle that
+        images = self.images
+        for loader, plan in plans:
+            for gid, rect, flags in plan:
+                images[gid] = loader(rect, flags)
+
+        for layer, loader in layer_loaders:
+            real_gid = len(self.images)
+            gid = self.register_gid(real_gid)
+            layer.gid = gid
+            self.images.append(loader())
+
+        for real_gid, loader in tile_loaders:
+            self.images[real_gid] = loader()
+
+    def _plan_tileset_images(
+        self,
+        tileset: TiledTileset,
+    ) -> list[tuple[int, tuple[int, int, int, int], TileFlags]]:
+        """Return the gid, rect, and flags of each used tile in a tileset.
+
+        Only the map data is inspected; no images are loaded.
+
+        Args:
+            tileset (TiledTileset): The tileset to plan.
+
+        Returns:
+            List[Tuple[int, Tuple[int, int, int, int], TileFlags]]: Tiles to load.
+
+        """
+        ts = tileset
+
+        stride_x = ts.tilewidth + ts.spacing
+        stride_y = ts.tileheight + ts.spacing
+        columns, rows = ts.grid_size()
+        if not columns:
+            return list()
+        count = ts.tilecount or columns * rows
+        # values that are constant for the tileset are bound to locals
+        # outside of the loop.
+        get_gids = self.gidmap.get
+        firstgid = ts.firstgid
+        tilewidth = ts.tilewidth
+        tileheight = ts.tileheight
+        margin = ts.margin
+        plan = list()
+        for index in range(count):
+            # gidmap is a defaultdict, so use get() to avoid inserting
+            # empty entries.  tiles that are never used are skipped.
+            gids = get_gids(firstgid + index)
+            if gids:
+                row, column = divmod(index, columns)
+                x = margin + column * stride_x
+                y = margin + row * stride_y
+                rect = (x, y, tilewidth, tileheight)
+                for gid, flags in gids:
+                    plan.append((gid, rect, flags))
+
+        return plan
 
     def get_tile_image(self, x: int, y: int, layer: int):
         """Return the tile image for this location.
@@ -745,7 +782,7 @@ class TiledMap(TiledElement):
 
         try:
             gid = layer.data[y][x]
-        except (IndexError, ValueError):
+        except IndexError:
             raise ValueError("GID not found")
         except TypeError:
             msg = "Tiles must be specified in integers."
@@ -773,13 +810,13 @@ class TiledMap(TiledElement):
             assert int(gid) >= 0
             return self.images[gid]
         except TypeError:
-            msg = "GIDs must be expressed as a number.  Got: {0}"
-            logger.debug(msg.format(gid))
-            raise TypeError(msg.format(gid))
+            msg = f"GIDs must be expressed as a number.  Got: {gid}"
+            logger.debug(msg)
+            raise TypeError(msg)
         except (AssertionError, IndexError):
-            msg = "Coords: ({0},{1}) in layer {2} has invalid GID: {3}"
-            logger.debug(msg.format(gid))
-            raise ValueError(msg.format(gid))
+            msg = f"Invalid GID: {gid}"
+            logger.debug(msg)
+            raise ValueError(msg)
 
     def get_tile_gid(self, x: int, y: int, layer: int) -> int:
         """Return the tile image GID for this location.
@@ -806,9 +843,9 @@ class TiledMap(TiledElement):
         try:
             return self.layers[int(layer)].data[int(y)][int(x)]
         except (IndexError, ValueError):
-            msg = "Coords: ({0},{1}) in layer {2} is invalid"
-            logger.debug(msg.format(x, y, layer))
-            raise ValueError(msg.format(x, y, layer))
+            msg = f"Coords: ({x},{y}) in layer {layer} is invalid"
+            logger.debug(msg)
+            raise ValueError(msg)
 
     def get_tile_properties(self, x: int, y: int, layer: int) -> Optional[dict]:
         """Return the tile image GID for this location.
@@ -835,19 +872,12 @@ class TiledMap(TiledElement):
         try:
             gid = self.layers[int(layer)].data[int(y)][int(x)]
         except (IndexError, ValueError):
-            msg = "Coords: ({0},{1}) in layer {2} is invalid."
-            logger.debug(msg.format(x, y, layer))
-            raise Exception(msg.format(x, y, layer))
+            msg = f"Coords: ({x},{y}) in layer {layer} is invalid."
+            logger.debug(msg)
+            raise Exception(msg)
 
         else:
-            try:
-                return self.tile_properties[gid]
-            except (IndexError, ValueError):
-                msg = "Coords: ({0},{1}) in layer {2} has invalid GID: {3}"
-                logger.debug(msg.format(x, y, layer, gid))
-                raise Exception(msg.format(x, y, layer, gid))
-            except KeyError:
-                return None
+            return self.tile_properties.get(gid)
 
     def get_tile_locations_by_gid(self, gid: int) -> Iterable[MapPoint]:
         """Search map for tile locations by the GID.
@@ -1004,9 +1034,14 @@ class TiledMap(TiledElement):
         except KeyError:
             raise ValueError("Tile GID not found")
 
-        for tileset in sorted(self.tilesets, key=attrgetter("firstgid"), reverse=True):
-            if tiled_gid >= tileset.firstgid:
-                return tileset
+        # the owner is the tileset with the highest firstgid not above the gid
+        tileset = max(
+            (ts for ts in self.tilesets if ts.firstgid <= tiled_gid),
+            key=attrgetter("firstgid"),
+            default=None,
+        )
+        if tileset is not None:
+            return tileset
 
         raise ValueError("Tileset not found")
 
@@ -1043,7 +1078,7 @@ class TiledMap(TiledElement):
             Iterable[TiledObject]: All objects associated with the map.
 
         """
-        return chain(*self.objectgroups)
+        return chain.from_iterable(self.objectgroups)
 
     @property
     def visible_layers(self):
@@ -1208,6 +1243,27 @@ class TiledTileset(TiledElement):
 
         self.parse_xml(node)
 
+    def grid_size(self) -> tuple[int, int]:
+        """Return the number of columns and rows of tiles in the tileset image.
+
+        The counts saved by Tiled are used when present.  Older files do not
+        save them, so they are computed with the same math that Tiled uses.
+
+        Returns:
+            Tuple[int, int]: Number of columns and rows.
+
+        """
+        columns = self.columns
+        if not columns:
+            stride = self.tilewidth + self.spacing
+            columns = (self.width - self.margin + self.spacing) // stride
+        if self.tilecount and columns:
+            rows = -(-self.tilecount // columns)
+        else:
+            stride = self.tileheight + self.spacing
+            rows = (self.height - self.margin + self.spacing) // stride
+        return columns, rows
+
     def parse_xml(self, node: ElementTree.Element) -> "TiledTileset":
         """Parse a Tileset from ElementTree xml element.
 
@@ -1255,6 +1311,7 @@ class TiledTileset(TiledElement):
         # since tile objects [probably] don't have a lot of metadata,
         # we store it separately in the parent (a TiledMap instance)
         register_gid = self.parent.register_gid
+        source_dir = os.path.dirname(source) if source else None
         for child in node.iter("tile"):
             tiled_gid = int(child.get("id"))
 
@@ -1263,7 +1320,7 @@ class TiledTileset(TiledElement):
 
             # images are listed as relative to the .tsx file, not the .tmx file:
             if source and "path" in p:
-                p["path"] = os.path.join(os.path.dirname(source), p["path"])
+                p["path"] = os.path.join(source_dir, p["path"])
 
             # handle tiles that have their own image
             image = child.find("image")
@@ -1271,10 +1328,11 @@ class TiledTileset(TiledElement):
                 p["width"] = self.tilewidth
                 p["height"] = self.tileheight
             else:
+                self.parent.has_external_tile_images = True
                 tile_source = image.get("source")
                 # images are listed as relative to the .tsx file, not the .tmx file:
                 if source and tile_source:
-                    tile_source = os.path.join(os.path.dirname(source), tile_source)
+                    tile_source = os.path.join(source_dir, tile_source)
                 p["source"] = tile_source
                 p["trans"] = image.get("trans", None)
                 p["width"] = image.get("width", None)
@@ -1395,8 +1453,10 @@ class TiledTileLayer(TiledElement):
 
         """
         images = self.parent.images
-        for x, y, gid in [i for i in self.iter_data() if i[2]]:
-            yield x, y, images[gid]
+        for y, row in enumerate(self.data):
+            for x, gid in enumerate(row):
+                if gid:
+                    yield x, y, images[gid]
 
     def _set_properties(self, node) -> None:
         TiledElement._set_properties(self, node)
@@ -1431,14 +1491,18 @@ class TiledTileLayer(TiledElement):
                 "XML tile elements are no longer supported. Must use base64 or csv map formats."
             )
 
-        temp = [
-            self.parent.register_gid_check_flags(gid)
-            for gid in unpack_gids(
-                text=data_node.text.strip(),
-                encoding=data_node.get("encoding", None),
-                compression=data_node.get("compression", None),
-            )
-        ]
+        raw_gids = unpack_gids(
+            text=data_node.text.strip(),
+            encoding=data_node.get("encoding", None),
+            compression=data_node.get("compression", None),
+        )
+
+        # layers repeat a handful of gids many times; register each distinct
+        # gid once, in order of first appearance so pytmx gids are assigned
+        # the same way as registering every tile, then translate the layer
+        register = self.parent.register_gid_check_flags
+        gid_lut = {gid: register(gid) for gid in dict.fromkeys(raw_gids)}
+        temp = list(map(gid_lut.__getitem__, raw_gids))
 
         self.data = reshape_data(temp, self.width)
         return self
@@ -17,8 +17,11 @@ GNU Lesser General Public License for more details.
 You should have received a copy of the GNU Lesser General Public
 License along with pytmx.  If not, see <http://www.gnu.org/licenses/>.
 """
-import itertools
 import logging
+import os
+from collections import defaultdict
+from concurrent.futures import Future
+from functools import lru_cache
 from typing import Optional, Union
 
 import pytmx
@@ -35,6 +38,23 @@ except ImportError:
 
 __all__ = ["load_pygame", "pygame_image_loader", "simplify", "build_rects"]
 
+# net (rotation, flip x, flip y) for each (horizontal, vertical, diagonal)
+# combination of tile flags.  tiled applies the diagonal flip first, which
+# is a 270 degree rotation followed by a horizontal flip; the horizontal
+# flip is folded into the final flip so at most two transforms are needed.
+# 0 and 1 hash and compare the same as False and True, so flags built from
+# ints find the same entries.
+_TRANSFORM_LUT = {
+    (False, False, False): (0, False, False),
+    (True, False, False): (0, True, False),
+    (False, True, False): (0, False, True),
+    (True, True, False): (0, True, True),
+    (False, False, True): (270, True, False),
+    (True, False, True): (270, False, False),
+    (False, True, True): (270, True, True),
+    (True, True, True): (270, False, True),
+}
+
 
 def handle_transformation(
     tile: pygame.Surface,
@@ -51,17 +71,49 @@ def handle_transformation(
         new tile surface
 
     """
-    if flags.flipped_diagonally:
-        tile = flip(rotate(tile, 270), True, False)
-    if flags.flipped_horizontally or flags.flipped_vertically:
-        tile = flip(tile, flags.flipped_horizontally, flags.flipped_vertically)
+    # TileFlags is a tuple, so it is used as the key as-is
+    angle, flipx, flipy = _TRANSFORM_LUT[flags]
+    if angle:
+        tile = rotate(tile, angle)
+    if flipx or flipy:
+        tile = flip(tile, flipx, flipy)
     return tile
 
 
+def _is_opaque(original: pygame.Surface) -> Optional[bool]:
+    """
+    Return True if the surface has no transparent pixels
+
+    Returns None if the check cannot be done, because the mask module is missing.
+
+    """
+    tile_size = original.get_size()
+    threshold = 254  # the default
+
+    # without per-pixel alpha or a colorkey, no pixel can be transparent
+    if not (original.get_flags() & pygame.SRCALPHA or original.get_colorkey()):
+        return True
+
+    try:
+        # the bounding rect of the opaque pixels stops at the first
+        # opaque row or column, so a tile with transparent pixels on
+        # an edge is found without scanning every pixel
+        if original.get_bounding_rect(threshold + 1).size != tile_size:
+            return False
+
+        # count the number of pixels in the tile that are not transparent
+        px = pygame.mask.from_surface(original, threshold).count()
+    except:
+        return None
+
+    return px == tile_size[0] * tile_size[1]
+
+
 def smart_convert(
     original: pygame.Surface,
     colorkey: Optional[ColorLike],
     pixelalpha: bool,
+    opaque: Optional[bool] = None,
 ) -> pygame.Surface:
     """
     Return new pygame Surface with optimal pixel/data format
@@ -73,6 +125,7 @@ def smart_convert(
         original: tile surface to inspect
         colorkey: optional colorkey for the tileset image
         pixelalpha: if true, prefer per-pixel alpha surfaces
+        opaque: if known, whether the tile has no transparent pixels
 
     Returns:
         new tile surface
@@ -83,33 +136,48 @@ def smart_convert(
         tile = original.convert()
         tile.set_colorkey(colorkey, pygame.RLEACCEL)
         # TODO: if there is a colorkey, count the colorkey pixels to determine if RLEACCEL should be used
+        return tile
 
     # no colorkey, so use a mask to determine if there are transparent pixels
-    else:
-        tile_size = original.get_size()
-        threshold = 254  # the default
-
-        try:
-            # count the number of pixels in the tile that are not transparent
-            px = pygame.mask.from_surface(original, threshold).count()
-        except:
+    if opaque is None:
+        opaque = _is_opaque(original)
+        if opaque is None:
             # pygame_sdl2 will fail because the mask module is not included
             # in this case, just convert_alpha and return it
             return original.convert_alpha()
 
-        # there are no transparent pixels in the image
-        if px == tile_size[0] * tile_size[1]:
-            tile = original.convert()
+    # there are transparent pixels, and set for perpixel alpha
+    if pixelalpha and not opaque:
+        return original.convert_alpha()
 
-        # there are transparent pixels, and set for perpixel alpha
-        elif pixelalpha:
-            tile = original.convert_alpha()
+    # there are no transparent pixels in the image, or
+    # there are transparent pixels, and we won't handle them
+    return original.convert()
 
-        # there are transparent pixels, and we won't handle them
-        else:
-            tile = original.convert()
 
-    return tile
+@lru_cache(maxsize=None)
+def _parse_colorkey(trans: str) -> tuple[int, int, int]:
+    """
+    Return the (r, g, b) color of a Tiled "trans" value, like "ff00ff"
+
+    """
+    value = int(trans.lstrip("#"), 16)
+    return (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+
+
+def _uses_most_tiles(tileset: pytmx.TiledTileset) -> bool:
+    """
+    Return True if at least half of the tiles in the tileset are used
+
+    """
+    ts = tileset
+    count = ts.tilecount
+    if not count:
+        columns, rows = ts.grid_size()
+        count = columns * rows
+    get_gids = ts.parent.gidmap.get
+    used = sum(1 for gid in range(ts.firstgid, ts.firstgid + count) if get_gids(gid))
+    return used * 2 >= count
 
 
 def pygame_image_loader(filename: str, colorkey: Optional[ColorLike], **kwargs):
@@ -124,26 +192,143 @@ def pygame_image_loader(filename: str, colorkey: Optional[ColorLike], **kwargs):
         function to load tile images
 
     """
-    if colorkey:
-        colorkey = pygame.Color("#{0}".format(colorkey))
+    # tiled gives colorkeys as hex strings; colors that are already parsed
+    # are passed to pygame as they are
+    if colorkey and isinstance(colorkey, str):
+        colorkey = _parse_colorkey(colorkey)
 
     pixelalpha = kwargs.get("pixelalpha", True)
-    image = pygame.image.load(filename)
+    # work on the whole tileset image only pays off when most tiles are used.
+    # image layers and tile images have no tileset; they are loaded as one
+    # tile, which smart_convert already converts once.
+    tileset = kwargs.get("tileset")
+    whole_image = tileset is not None and _uses_most_tiles(tileset)
+    # TiledMap.reload_images passes a thread pool for the length of the load,
+    # so several images can be decoded at once.  pygame releases the GIL
+    # while decoding.  conversion to the display format stays on this thread.
+    # it also passes a dict that shares each decoded file between the loaders
+    # of that load; the shared surfaces are never modified.
+    executor = kwargs.get("executor")
+    image_files = kwargs.get("image_files")
+    path = os.path.realpath(filename)
+    image_future = image_files.get(path) if image_files is not None else None
+    if image_future is None:
+        if executor is not None:
+            try:
+                image_future = executor.submit(pygame.image.load, filename)
+            except RuntimeError:
+                # threads cannot be started everywhere pygame runs, for
+                # example in the browser; decode on this thread instead
+                executor = None
+        if executor is None:
+            image_future = Future()
+            image_future.set_result(pygame.image.load(filename))
+        if image_files is not None:
+            image_files[path] = image_future
+    image = None
+    preconverted = False
+    # one mask for the whole image; tiles count their opaque pixels from it.
+    # this is a single pass over the image in C, like a surfarray reduction
+    # would be, but it does not need numpy.
+    image_mask = None
+    sheet_opaque = False
+    tile_masks = dict()
+    opacity = dict()
 
     def load_image(rect=None, flags=None):
+        nonlocal image, preconverted, image_mask, sheet_opaque
+        if image is None:
+            image = image_future.result()
+            # when every tile would be converted to the same opaque format,
+            # convert the whole image once instead of once per tile
+            opaque_format = (
+                colorkey
+                or not pixelalpha
+                or not (image.get_flags() & pygame.SRCALPHA or image.get_colorkey())
+            )
+            if whole_image and opaque_format:
+                image = image.convert()
+                preconverted = True
+                if colorkey:
+                    # tiles copied from the image keep the colorkey.  the mask
+                    # is used to find the tiles that have colorkey pixels.
+                    image.set_colorkey(colorkey)
+            elif whole_image:
+                # tiles with transparent pixels are then converted from a
+                # surface that is already in the display alpha format
+                if image.get_flags() & pygame.SRCALPHA:
+                    image = image.convert_alpha()
+            if whole_image and (colorkey or not preconverted):
+                try:
+                    image_mask = pygame.mask.from_surface(image, 254)
+                except:
+                    # pygame_sdl2 does not include the mask module
+                    pass
+                else:
+                    width, height = image_mask.get_size()
+                    if image_mask.count() == width * height:
+                        # no pixel in the image is transparent, so no tile
+                        # needs checking and all of them can share one format
+                        sheet_opaque = True
+                        image_mask = None
+                        if not preconverted:
+                            image = image.convert()
+                            preconverted = True
+
         if rect:
             try:
                 tile = image.subsurface(rect)
             except ValueError:
                 logger.error("Tile bounds outside bounds of tileset image")
                 raise
-        else:
+        elif preconverted:
             tile = image.copy()
+        else:
+            # smart_convert returns a new surface, so the image is not changed
+            tile = image
+
+        opaque = True if sheet_opaque else None
+        if (
+            rect
+            and not sheet_opaque
+            and (
+                image_mask is not None
+                or (pixelalpha and not (preconverted or colorkey))
+            )
+        ):
+            # flips and rotations do not change which pixels are opaque, so
+            # the check is done once per rect and shared by all flag variants
+            opaque = opacity.get(rect)
+            if opaque is None:
+                if image_mask is not None:
+                    # count the opaque pixels under the tile in the image mask
+                    x, y, w, h = rect
+                    try:
+                        tile_mask = tile_masks[w, h]
+                    except KeyError:
+                        tile_mask = pygame.mask.Mask((w, h), fill=True)
+                        tile_masks[w, h] = tile_mask
+                    opaque = image_mask.overlap_area(tile_mask, (x, y)) == w * h
+                else:
+                    opaque = _is_opaque(tile)
+                opacity[rect] = opaque
 
-        if flags:
+        # most tiles are not flipped or rotated.  TileFlags is a tuple, so
+        # it is truthy even when every flag is false; check the values.
+        if flags and any(flags):
             tile = handle_transformation(tile, flags)
 
-        tile = smart_convert(tile, colorkey, pixelalpha)
+        if preconverted:
+            # tiles must not share pixels with the tileset image
+            if tile.get_parent() is not None:
+                tile = tile.copy()
+            # RLE only pays off for tiles with colorkey pixels.  tiles without
+            # them keep the plain colorkey copied from the image.
+            if colorkey and not opaque:
+                tile.set_colorkey(colorkey, pygame.RLEACCEL)
+            return tile
+
+        tile = smart_convert(tile, colorkey, pixelalpha, opaque)
         return tile
 
     return load_image
@@ -210,48 +395,62 @@ def build_rects(
         try:
             tileset = tmxmap.tilesets[tileset]
         except IndexError:
-            msg = "Tileset #{0} not found in map {1}."
-            logger.debug(msg.format(tileset, tmxmap))
-            raise IndexError
+            msg = f"Tileset #{tileset} not found in map {tmxmap}."
+            logger.debug(msg)
+            raise IndexError(msg)
 
     elif isinstance(tileset, str):
-        try:
-            tileset = [t for t in tmxmap.tilesets if t.name == tileset].pop()
-        except IndexError:
-            msg = 'Tileset "{0}" not found in map {1}.'
-            logger.debug(msg.format(tileset, tmxmap))
-            raise ValueError
+        # the last tileset with the name wins, as it does for layers
+        name = tileset
+        tileset = next((t for t in reversed(tmxmap.tilesets) if t.name == name), None)
+        if tileset is None:
+            msg = f'Tileset "{name}" not found in map {tmxmap}.'
+            logger.debug(msg)
+            raise ValueError(msg)
 
     elif tileset:
-        msg = "Tileset must be either a int or string. got: {0}"
-        logger.debug(msg.format(type(tileset)))
-        raise TypeError
+        msg = f"Tileset must be either a int or string. got: {type(tileset)}"
+        logger.debug(msg)
+        raise TypeError(msg)
 
     gid = None
     if real_gid:
         try:
             gid, flags = tmxmap.map_gid(real_gid)[0]
         except IndexError:
-            msg = "GID #{0} not found"
-            logger.debug(msg.format(real_gid))
-            raise ValueError
+            msg = f"GID #{real_gid} not found"
+            logger.debug(msg)
+            raise ValueError(msg)
 
     if isinstance(layer, int):
-        layer_data = tmxmap.get_layer_data(layer)
-    elif isinstance(layer, str):
         try:
-            layer = [l for l in tmxmap.layers if l.name == layer].pop()
-            layer_data = layer.data
+            layer_data = tmxmap.layers[layer].data
         except IndexError:
-            msg = 'Layer "{0}" not found in map {1}.'
-            logger.debug(msg.format(layer, tmxmap))
-            raise ValueError
+            msg = f"Layer #{layer} not found in map {tmxmap}."
+            logger.debug(msg)
+            raise ValueError(msg)
+    elif isinstance(layer, str):
+        layer_data = tmxmap.get_layer_by_name(layer).data
+    else:
+        msg = f"Layer must be either a int or string. got: {type(layer)}"
+        logger.debug(msg)
+        raise TypeError(msg)
 
-    p = itertools.product(range(tmxmap.width), range(tmxmap.height))
+    # walk the rows directly instead of indexing layer_data once per cell
     if gid:
-        points = [(x, y) for (x, y) in p if layer_data[y][x] == gid]
+        points = [
+            (x, y)
+            for y, row in enumerate(layer_data)
+            for x, value in enumerate(row)
+            if value == gid
+        ]
     else:
-        points = [(x, y) for (x, y) in p if layer_data[y][x]]
+        points = [
+            (x, y)
+            for y, row in enumerate(layer_data)
+            for x, value in enumerate(row)
+            if value
+        ]
 
     rects = simplify(points, tmxmap.tilewidth, tmxmap.tileheight)
     return rects
@@ -304,49 +503,52 @@ def simplify(
     making a list of rects, one for each tile on the map!
     """
 
-    def pick_rect(points, rects) -> None:
-        ox, oy = sorted([(sum(p), p) for p in points])[0][1]
-        x = ox
-        y = oy
-        ex = None
-
-        while 1:
-            x += 1
-            if not (x, y) in points:
-                if ex is None:
-                    ex = x - 1
-
-                if (ox, y + 1) in points:
-                    if x == ex + 1:
-                        y += 1
-                        x = ox
-
-                    else:
-                        y -= 1
-                        break
-                else:
-                    if x <= ex:
-                        y -= 1
-                    break
-
-        c_rect = pygame.Rect(
-            ox * tilewidth,
-            oy * tileheight,
-            (ex - ox + 1) * tilewidth,
-            (y - oy + 1) * tileheight,
+    # group the points into rows of horizontal runs, then stack runs that
+    # cover the same columns on consecutive rows into a single rect
+    # each row is a bitset of its occupied columns, so a run of tiles is
+    # found with a few integer operations instead of one step per tile
+    rows = defaultdict(int)
+    for x, y in all_points:
+        rows[int(y)] |= 1 << int(x)
+
+    def close(run, top, bottom) -> None:
+        x0, x1 = run
+        rect_list.append(
+            pygame.Rect(
+                x0 * tilewidth,
+                top * tileheight,
+                (x1 - x0 + 1) * tilewidth,
+                (bottom - top + 1) * tileheight,
+            )
         )
 
-        rects.append(c_rect)
-
-        rect = pygame.Rect(ox, oy, ex - ox + 1, y - oy + 1)
-        kill = [p for p in points if rect.collidepoint(p)]
-        [points.remove(i) for i in kill]
-
-        if points:
-            pick_rect(points, rects)
-
     rect_list = []
-    while all_points:
-        pick_rect(all_points, rect_list)
-
+    open_runs = dict()  # (first x, last x) -> top row of the rect
+    last_y = None
+    for y in sorted(rows):
+        if last_y is not None and y != last_y + 1:
+            for run, top in open_runs.items():
+                close(run, top, last_y)
+            open_runs = dict()
+
+        bits = rows[y]
+        runs = []
+        while bits:
+            low = bits & -bits  # first column of the run
+            end = (bits + low) & ~bits  # first empty column after it
+            runs.append((low.bit_length() - 1, end.bit_length() - 2))
+            bits ^= end - low
+
+        continued = dict()
+        for run in runs:
+            continued[run] = open_runs.pop(run, y)
+        for run, top in open_runs.items():
+            close(run, top, last_y)
+        open_runs = continued
+        last_y = y
+
+    for run, top in open_runs.items():
+        close(run, top, last_y)
+
+    rect_list.sort(key=lambda r: (r.y, r.x))
     return rect_list
@@ -17,7 +17,9 @@ You should have received a copy of the GNU Lesser General Public
 License along with pytmx.  If not, see <http://www.gnu.org/licenses/>.
 """
 import dataclasses
+import itertools
 import logging
+import sys
 from functools import partial
 from typing import Any, Optional
 
@@ -35,7 +37,11 @@ except ImportError:
     raise
 
 
-@dataclasses.dataclass(order=True)
+# slots keep the many tile instances small; dataclass slots need python 3.10
+_dataclass_options = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclasses.dataclass(order=True, **_dataclass_options)
 class PygameSDL2Tile:
     texture: Texture
     srcrect: Rect
@@ -46,6 +52,25 @@ class PygameSDL2Tile:
     flipy: bool = False
 
 
+def _flag_transform(
+    flipped_horizontally: bool, flipped_vertically: bool, flipped_diagonally: bool
+) -> tuple[float, bool, bool]:
+    if flipped_diagonally:
+        if flipped_vertically:
+            return 270, False, False
+        else:
+            return 90, False, False
+    else:
+        return 0.0, flipped_horizontally, flipped_vertically
+
+
+# there are only eight combinations of flags, so look them up
+_FLAG_TRANSFORMS = {
+    flags: _flag_transform(*flags)
+    for flags in itertools.product((False, True), repeat=3)
+}
+
+
 def handle_flags(flags: Optional[pytmx.TileFlags]) -> tuple[float, bool, bool]:
     """
     Return angle and flip values for the SDL2 renderer
@@ -53,14 +78,7 @@ def handle_flags(flags: Optional[pytmx.TileFlags]) -> tuple[float, bool, bool]:
     """
     if flags is None:
         return 0.0, False, False
-
-    if flags.flipped_diagonally:
-        if flags.flipped_vertically:
-            return 270, False, False
-        else:
-            return 90, False, False
-    else:
-        return 0.0, flags.flipped_horizontally, flags.flipped_vertically
+    return _FLAG_TRANSFORMS[flags]
 
 
 def pygame_sd2_image_loader(renderer: Renderer, filename: str, colorkey, **kwargs):
@@ -60,7 +60,7 @@ def pyglet_image_loader(filename, colorkey, **kwargs):
         else:
             tile = image
 
-        if flags:
+        if flags and any(flags):
             logger.error("tile flags are not implemented")
 
         return tile
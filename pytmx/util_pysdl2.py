@@ -17,8 +17,9 @@ GNU Lesser General Public License for more details.
 You should have received a copy of the GNU Lesser General Public
 License along with pytmx.  If not, see <http://www.gnu.org/licenses/>.
 """
+import itertools
 import logging
-from functools import partial
+from functools import lru_cache, partial
 
 logger = logging.getLogger(__name__)
 
@@ -34,33 +35,50 @@ __all__ = [
     "load_pysdl2",
     "pysdl2_image_loader",
 ]
-flag_names = (
-    "flipped_horizontally",
-    "flipped_vertically",
-    "flipped_diagonally",
-)
 
+# the flip value for each of the eight combinations of TileFlags.
+# 4 is not an SDL flag; it marks a diagonal flip.
+_FLIP_BITS = {
+    (h, v, d): (
+        (sdl2.SDL_FLIP_HORIZONTAL if h else 0)
+        | (sdl2.SDL_FLIP_VERTICAL if v else 0)
+        | (4 if d else 0)
+    )
+    for h, v, d in itertools.product((False, True), repeat=3)
+}
 
-def pysdl2_image_loader(renderer, filename, colorkey, **kwargs):
-    def convert(surface):
-        texture_ = sdl2.SDL_CreateTextureFromSurface(renderer.renderer, surface)
-        sdl2.SDL_SetTextureBlendMode(texture_, sdl2.SDL_BLENDMODE_BLEND)
-        sdl2.SDL_FreeSurface(surface)
-        return texture_
 
+@lru_cache(maxsize=None)
+def _parse_colorkey(colorkey: str) -> tuple[int, int, int]:
+    """
+    Return the (r, g, b) color of a Tiled "trans" value, like "ff00ff"
+
+    """
+    return tuple(sdl2.ext.string_to_color("#" + colorkey)[:3])
+
+
+def convert(renderer, surface):
+    """
+    Return a blending texture made from the surface, and free the surface
+
+    """
+    texture = sdl2.SDL_CreateTextureFromSurface(renderer.renderer, surface)
+    sdl2.SDL_SetTextureBlendMode(texture, sdl2.SDL_BLENDMODE_BLEND)
+    sdl2.SDL_FreeSurface(surface)
+    return texture
+
+
+def pysdl2_image_loader(renderer, filename, colorkey, **kwargs):
     def load_image(rect=None, flags=None):
         if rect:
             try:
-                flip = 0
-                if flags.flipped_horizontally:
-                    flip |= sdl2.SDL_FLIP_HORIZONTAL
-                if flags.flipped_vertically:
-                    flip |= sdl2.SDL_FLIP_VERTICAL
-                if flags.flipped_diagonally:
-                    flip |= 4
-
-                rect = sdl2.rect.SDL_Rect(*rect)
-                return texture, rect, flip
+                flip = _FLIP_BITS[flags] if flags else 0
+                # tiles that differ only in their flags share one SDL_Rect
+                try:
+                    sdl_rect = sdl_rects[rect]
+                except KeyError:
+                    sdl_rect = sdl_rects[rect] = sdl2.rect.SDL_Rect(*rect)
+                return texture, sdl_rect, flip
 
             except ValueError:
                 logger.error("Tile bounds outside bounds of tileset image")
@@ -69,13 +87,13 @@ def pysdl2_image_loader(renderer, filename, colorkey, **kwargs):
             return texture, None, 0
 
     image = sdl2.ext.load_image(filename)
+    sdl_rects = dict()
 
     if colorkey:
-        colorkey = sdl2.ext.string_to_color("#" + colorkey)
-        key = sdl2.SDL_MapRGB(image.format, *colorkey[:3])
+        key = sdl2.SDL_MapRGB(image.format, *_parse_colorkey(colorkey))
         sdl2.SDL_SetColorKey(image, sdl2.SDL_TRUE, key)
 
-    texture = convert(image)
+    texture = convert(renderer, image)
 
     return load_image
 
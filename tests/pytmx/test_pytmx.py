@@ -1,3 +1,6 @@
+import itertools
+import os
+import tempfile
 import unittest
 
 import pytmx
@@ -65,6 +68,21 @@ class TestConvertToBool(unittest.TestCase):
             convert_to_bool("200")
 
 
+class DecodeGidTestCase(unittest.TestCase):
+    def test_decode_gid_flags(self) -> None:
+        for h, v, d in itertools.product((False, True), repeat=3):
+            raw_gid = 42
+            if h:
+                raw_gid |= pytmx.pytmx.GID_TRANS_FLIPX
+            if v:
+                raw_gid |= pytmx.pytmx.GID_TRANS_FLIPY
+            if d:
+                raw_gid |= pytmx.pytmx.GID_TRANS_ROT
+            self.assertEqual(
+                pytmx.pytmx.decode_gid(raw_gid), (42, pytmx.TileFlags(h, v, d))
+            )
+
+
 class TiledMapTest(unittest.TestCase):
     filename = "tests/resources/test01.tmx"
 
@@ -82,6 +100,25 @@ class TiledMapTest(unittest.TestCase):
         except ImportError:
             pass
 
+    def test_build_rects_errors(self) -> None:
+        try:
+            from pytmx import util_pygame
+        except ImportError:
+            return
+
+        with self.assertRaises(ValueError):
+            util_pygame.build_rects(self.m, "Grass and Water", "missing", None)
+        with self.assertRaises(ValueError):
+            util_pygame.build_rects(self.m, "missing", "tileset", None)
+        with self.assertRaises(ValueError):
+            util_pygame.build_rects(self.m, len(self.m.layers), "tileset", None)
+        with self.assertRaises(TypeError):
+            util_pygame.build_rects(self.m, None, "tileset", None)
+        self.assertEqual(
+            util_pygame.build_rects(self.m, 0, "tileset", None),
+            util_pygame.build_rects(self.m, self.m.layers[0].name, "tileset", None),
+        )
+
     def test_get_tile_image(self) -> None:
         image = self.m.get_tile_image(0, 0, 0)
 
@@ -92,6 +129,17 @@ class TiledMapTest(unittest.TestCase):
         image = self.m.get_tile_image_by_gid(1)
         self.assertIsNotNone(image)
 
+        with self.assertRaises(ValueError):
+            self.m.get_tile_image_by_gid(len(self.m.images))
+
+    def test_get_tileset_from_gid(self) -> None:
+        gid = self.m.register_gid(1)
+        self.assertEqual(self.m.get_tileset_from_gid(gid).name, "tileset")
+        gid = self.m.register_gid(338)
+        self.assertEqual(self.m.get_tileset_from_gid(gid).name, "tiles")
+        with self.assertRaises(ValueError):
+            self.m.get_tileset_from_gid(self.m.maxgid)
+
     def test_reserved_names_check_disabled_with_option(self) -> None:
         pytmx.TiledElement.allow_duplicate_names = False
         pytmx.TiledMap(allow_duplicate_names=True)
@@ -170,3 +218,285 @@ class TiledElementTestCase(unittest.TestCase):
     def test_repr(self) -> None:
         self.element.name = "foo"
         self.assertEqual('<TiledElement: "foo">', self.element.__repr__())
+
+
+class HandleTransformationTestCase(unittest.TestCase):
+    def test_matches_sequential_transforms(self) -> None:
+        try:
+            import pygame
+            from pygame.transform import flip, rotate
+
+            from pytmx import util_pygame
+        except ImportError:
+            return
+
+        tile = pygame.Surface((3, 2))
+        for i in range(6):
+            tile.set_at((i % 3, i // 3), (i * 40, 0, 0))
+
+        for h, v, d in itertools.product((False, True), repeat=3):
+            expected = tile
+            if d:
+                expected = flip(rotate(expected, 270), True, False)
+            if h or v:
+                expected = flip(expected, h, v)
+            result = util_pygame.handle_transformation(tile, pytmx.TileFlags(h, v, d))
+            self.assertEqual(
+                pygame.image.tostring(expected, "RGB"),
+                pygame.image.tostring(result, "RGB"),
+            )
+
+
+class SimplifyTestCase(unittest.TestCase):
+    def test_docstring_example(self) -> None:
+        try:
+            from pytmx import util_pygame
+        except ImportError:
+            return
+
+        grid = ["0111000", "0110000", "0000040", "0000040", "0000000", "0011111"]
+        points = [
+            (x, y)
+            for y, row in enumerate(grid)
+            for x, value in enumerate(row)
+            if value != "0"
+        ]
+        rects = util_pygame.simplify(points, 2, 1)
+        self.assertEqual(
+            rects, [(2, 0, 6, 1), (2, 1, 4, 1), (10, 2, 2, 2), (4, 5, 10, 1)]
+        )
+
+
+class TilesetGeometryTestCase(unittest.TestCase):
+    xml = """<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.0" orientation="orthogonal" width="3" height="1"
+     tilewidth="16" tileheight="16">
+ <tileset firstgid="1" name="ts" tilewidth="16" tileheight="16" margin="4"{counts}>
+  <image source="ts.png" width="100" height="40"/>
+ </tileset>
+ <layer name="layer" width="3" height="1">
+  <data encoding="csv">5,6,7</data>
+ </layer>
+</map>
+"""
+
+    def load(self, counts: str) -> pytmx.TiledMap:
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, "map.tmx")
+            with open(filename, "w") as fp:
+                fp.write(self.xml.format(counts=counts))
+            return pytmx.TiledMap(filename)
+
+    def check_layout(self, tmxmap: pytmx.TiledMap) -> None:
+        # the margin is only on the top and left: (100 - 4) // 16 = 6 columns
+        self.assertEqual(tmxmap.get_tile_image(0, 0, 0)[1], (68, 4, 16, 16))
+        self.assertEqual(tmxmap.get_tile_image(1, 0, 0)[1], (84, 4, 16, 16))
+        self.assertEqual(tmxmap.get_tile_image(2, 0, 0)[1], (4, 20, 16, 16))
+
+    def test_layout_from_saved_counts(self) -> None:
+        tmxmap = self.load(' columns="6" tilecount="12"')
+        self.assertEqual(tmxmap.tilesets[0].grid_size(), (6, 2))
+        self.check_layout(tmxmap)
+
+    def test_layout_from_image_size(self) -> None:
+        tmxmap = self.load("")
+        self.assertEqual(tmxmap.tilesets[0].grid_size(), (6, 2))
+        self.check_layout(tmxmap)
+
+
+class ParseColorkeyTestCase(unittest.TestCase):
+    def test_parse_colorkey(self) -> None:
+        try:
+            from pytmx import util_pygame
+        except ImportError:
+            return
+
+        self.assertEqual(util_pygame._parse_colorkey("ff00ff"), (255, 0, 255))
+        self.assertEqual(util_pygame._parse_colorkey("#0a0b0c"), (10, 11, 12))
+
+
+class PygameImageLoaderTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        try:
+            import pygame
+        except ImportError:
+            self.skipTest("pygame is not installed")
+
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        pygame.display.init()
+        pygame.display.set_mode((16, 16))
+
+    def test_no_threads_left_after_load(self) -> None:
+        import threading
+
+        from pytmx import util_pygame
+
+        util_pygame.load_pygame("tests/resources/test01.tmx")
+        names = [thread.name for thread in threading.enumerate()]
+        self.assertFalse([name for name in names if "pytmx" in name])
+
+    def test_load_without_threads(self) -> None:
+        import threading
+        from unittest import mock
+
+        from pytmx import util_pygame
+
+        error = RuntimeError("can't start new thread")
+        with mock.patch.object(threading.Thread, "start", side_effect=error):
+            tmxmap = util_pygame.load_pygame("tests/resources/test01.tmx")
+        self.assertTrue(any(image is not None for image in tmxmap.images))
+
+    def test_decoded_files_are_released_after_load(self) -> None:
+        import gc
+        import weakref
+        from unittest import mock
+
+        import pygame
+
+        from pytmx import util_pygame
+
+        loaded = list()
+        load = pygame.image.load
+
+        def tracking_load(filename):
+            surface = load(filename)
+            loaded.append(weakref.ref(surface))
+            return surface
+
+        with mock.patch.object(pygame.image, "load", tracking_load):
+            tmxmap = util_pygame.load_pygame("tests/resources/test01.tmx")
+        self.assertTrue(loaded)
+        del tmxmap
+        gc.collect()
+        self.assertEqual([ref for ref in loaded if ref() is not None], [])
+
+    def test_shared_file_is_decoded_once_per_load(self) -> None:
+        from unittest import mock
+
+        import pygame
+
+        from pytmx import util_pygame
+
+        xml = """<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.0" orientation="orthogonal" width="2" height="1"
+     tilewidth="8" tileheight="8">
+ <tileset firstgid="1" name="first" tilewidth="8" tileheight="8">
+  <image source="ts.png" width="16" height="8"/>
+ </tileset>
+ <tileset firstgid="3" name="second" tilewidth="8" tileheight="8">
+  <image source="./ts.png" width="16" height="8"/>
+ </tileset>
+ <layer name="layer" width="2" height="1">
+  <data encoding="csv">1,4</data>
+ </layer>
+</map>
+"""
+        filenames = list()
+        load = pygame.image.load
+
+        def tracking_load(filename):
+            filenames.append(filename)
+            return load(filename)
+
+        with tempfile.TemporaryDirectory() as path:
+            pygame.image.save(pygame.Surface((16, 8)), os.path.join(path, "ts.png"))
+            filename = os.path.join(path, "map.tmx")
+            with open(filename, "w") as fp:
+                fp.write(xml)
+            with mock.patch.object(pygame.image, "load", tracking_load):
+                for _ in range(2):
+                    tmxmap = util_pygame.load_pygame(filename)
+                    self.assertIsNotNone(tmxmap.get_tile_image(1, 0, 0))
+        self.assertEqual(len(filenames), 2)
+
+    def load_sheet(self, pixels, gids, trans=None, alpha=True) -> pytmx.TiledMap:
+        """Load a map with one row of 8x8 tiles, one tile per pixel color.
+
+        Each color is drawn over a whole tile, except for the top left pixel
+        of the tile, which is drawn in the second color of the pair.
+
+        """
+        import pygame
+
+        from pytmx import util_pygame
+
+        flags = pygame.SRCALPHA if alpha else 0
+        sheet = pygame.Surface((8 * len(pixels), 8), flags, 32)
+        for index, (color, corner) in enumerate(pixels):
+            sheet.fill(color, (index * 8, 0, 8, 8))
+            sheet.set_at((index * 8, 0), corner)
+
+        trans_attr = f' trans="{trans}"' if trans else ""
+        xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.0" orientation="orthogonal" width="{len(gids)}" height="1"
+     tilewidth="8" tileheight="8">
+ <tileset firstgid="1" name="ts" tilewidth="8" tileheight="8">
+  <image source="ts.png"{trans_attr} width="{8 * len(pixels)}" height="8"/>
+ </tileset>
+ <layer name="layer" width="{len(gids)}" height="1">
+  <data encoding="csv">{",".join(str(gid) for gid in gids)}</data>
+ </layer>
+</map>
+"""
+        with tempfile.TemporaryDirectory() as path:
+            pygame.image.save(sheet, os.path.join(path, "ts.png"))
+            filename = os.path.join(path, "map.tmx")
+            with open(filename, "w") as fp:
+                fp.write(xml)
+            return util_pygame.load_pygame(filename)
+
+    def tile_images(self, tmxmap: pytmx.TiledMap) -> list:
+        return [tmxmap.get_tile_image(x, 0, 0) for x in range(tmxmap.width)]
+
+    def test_alpha_sheet(self) -> None:
+        import pygame
+
+        opaque = ((10, 20, 30, 255), (10, 20, 30, 255))
+        clear = ((10, 20, 30, 255), (0, 0, 0, 0))
+        pixels = [opaque, clear] * 4
+
+        # every tile used: the whole sheet is converted and masked at once
+        # only two of eight tiles used: each tile is converted by itself
+        for gids in (list(range(1, 9)), [1, 2]):
+            images = self.tile_images(self.load_sheet(pixels, gids))
+            for gid, image in zip(gids, images):
+                has_alpha = bool(image.get_flags() & pygame.SRCALPHA)
+                self.assertEqual(has_alpha, gid % 2 == 0, gids)
+                self.assertEqual(image.get_at((0, 0)), pixels[gid - 1][1])
+                self.assertIsNone(image.get_parent())
+
+    def test_colorkey_sheet(self) -> None:
+        import pygame
+
+        keyed = ((10, 20, 30), (255, 0, 255))
+        plain = ((10, 20, 30), (10, 20, 30))
+        images = self.tile_images(
+            self.load_sheet([keyed, plain], [1, 2], trans="ff00ff", alpha=False)
+        )
+        for image, uses_key in zip(images, (True, False)):
+            self.assertEqual(image.get_colorkey(), (255, 0, 255, 255))
+            self.assertFalse(image.get_flags() & pygame.SRCALPHA)
+            self.assertEqual(bool(image.get_flags() & pygame.RLEACCELOK), uses_key)
+
+    def test_flipped_tile_shares_rect(self) -> None:
+        import pygame
+
+        clear = ((10, 20, 30, 255), (0, 0, 0, 0))
+        flipped = 1 | pytmx.pytmx.GID_TRANS_FLIPX
+        plain, flipx = self.tile_images(self.load_sheet([clear], [1, flipped]))
+        self.assertIsNot(plain, flipx)
+        for image in plain, flipx:
+            self.assertTrue(image.get_flags() & pygame.SRCALPHA)
+        self.assertEqual(plain.get_at((0, 0)), (0, 0, 0, 0))
+        self.assertEqual(flipx.get_at((7, 0)), (0, 0, 0, 0))
+        self.assertEqual(flipx.get_at((0, 0)), (10, 20, 30, 255))
+
+    def test_opaque_sheet(self) -> None:
+        import pygame
+
+        opaque = ((10, 20, 30, 255), (40, 50, 60, 255))
+        images = self.tile_images(self.load_sheet([opaque] * 2, [1, 2]))
+        for image in images:
+            self.assertFalse(image.get_flags() & pygame.SRCALPHA)
+            self.assertIsNone(image.get_colorkey())
+            self.assertEqual(image.get_at((0, 0)), (40, 50, 60, 255))